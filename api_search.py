@@ -2,17 +2,46 @@ import os
 import json
 import zipfile
 import io
+import re
+import struct
+import hashlib
+import threading
+import time
+import datetime
+from bisect import bisect_left
+from collections import OrderedDict
 from flask import Flask, request, jsonify, send_file, Response
 from flask_cors import CORS
 
 DATA_PATH = "/processed_karaoke/Data"
 MASTER_INDEX_PATH = os.path.join(DATA_PATH, 'master_index_v6.json')
 CHUNK_PATH = os.path.join(DATA_PATH, 'preview_chunk_v6')
+SONG_MANIFEST_PATH = os.path.join(DATA_PATH, 'song_manifest_v6.json')
+NGRAM_MASTER_PATH = os.path.join(DATA_PATH, 'ngram_master_v6.json')
+NGRAM_RECORDS_PATH = os.path.join(DATA_PATH, 'ngram_records_v6.json')
+NGRAM_CHUNK_PATH = os.path.join(DATA_PATH, 'ngram_chunk_v6')
+SUPER_ZIP_PATH = "/Users/digixtwo/Desktop/karaoke_API/karaoke.env/dbf-karaoke-last/processed_karaoke"
+MAX_BATCH_QUERIES = 50
+MAX_BUNDLE_SONGS = 100
+LEGACY_MEMBER_CACHE_SIZE = 16
+NGRAM_MAX_SCANNED = 5000
+NGRAM_HITS_PER_RESULT = 4
+WORD_PATTERN = re.compile(r'[a-zA-Z\d\u0e00-\u0e7f]+')
 
 
 app = Flask(__name__)
 master_index = None
 chunk_cache = {}
+song_aliases = {}
+etag_cache = {}
+super_zip_cache = {}
+legacy_member_cache = OrderedDict()
+legacy_member_cache_lock = threading.Lock()
+ngram_index = None
+ngram_chunk_cache = {}
+
+# ไฟล์ index ที่บีบอัดล่วงหน้าโดย IndexBuilder (เรียงตามลำดับที่ server ต้องการส่ง)
+PRECOMPRESSED_ENCODINGS = [('br', '.br'), ('zstd', '.zst'), ('gzip', '.gz')]
 
 
 origins_regex = r"http://localhost:300[0-9]" 
@@ -32,6 +61,82 @@ def load_master_index():
         print(f"CRITICAL ERROR: Failed to load or parse master index: {e}")
         master_index = None
 
+def load_song_manifest():
+    """
+    โหลด song manifest (เพลงที่ถูก dedup จะชี้ไปยัง superIndex/member ของเพลงต้นฉบับ)
+    """
+    global song_aliases
+    try:
+        with open(SONG_MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        song_aliases = {int(i): (loc['s'], loc['m']) for i, loc in manifest.get('aliases', {}).items()}
+        print(f"Song manifest loaded: {len(song_aliases)} aliases.")
+    except FileNotFoundError:
+        song_aliases = {}
+    except Exception as e:
+        print(f"WARNING: Failed to load song manifest: {e}")
+        song_aliases = {}
+
+def load_ngram_index():
+    """
+    โหลด n-gram index (ถ้ามี) ใช้เฉพาะเมื่อ build พร้อมกับ master index ชุดปัจจุบัน
+    """
+    global ngram_index
+    ngram_index = None
+    try:
+        with open(NGRAM_MASTER_PATH, 'r', encoding='utf-8') as f:
+            ngram_master = json.load(f)
+        if not master_index or ngram_master.get('lastBuilt') != master_index.get('lastBuilt'):
+            print("WARNING: N-gram index does not match master index. Infix search disabled.")
+            return
+        with open(NGRAM_RECORDS_PATH, 'r', encoding='utf-8') as f:
+            ngram_master['records'] = json.load(f)
+        ngram_index = ngram_master
+        print(f"N-gram index loaded: {len(ngram_index['gramToChunkMap'])} grams.")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"WARNING: Failed to load n-gram index: {e}")
+
+def get_ngram_chunk(chunk_id: int):
+    if chunk_id in ngram_chunk_cache:
+        return ngram_chunk_cache[chunk_id]
+    try:
+        with open(os.path.join(NGRAM_CHUNK_PATH, f"{chunk_id}.json"), 'r', encoding='utf-8') as f:
+            chunk_data = json.load(f)
+            ngram_chunk_cache[chunk_id] = chunk_data
+            return chunk_data
+    except Exception:
+        return None
+
+def get_ngram_candidates(search_terms):
+    """
+    หา record ที่มีทุก n-gram ของคำค้น (ไล่ posting list ที่สั้นที่สุด แล้วเช็คใน list อื่นด้วย bisect)
+    คืนค่าเป็น generator ที่ไล่ไม่เกิน NGRAM_MAX_SCANNED record เพื่อจำกัดเวลาค้นหาเมื่อ catalog ใหญ่ขึ้น
+    คืนค่า None ถ้าคำค้นสั้นเกินกว่าจะใช้ n-gram ได้ ผลลัพธ์ต้องตรวจสอบซ้ำด้วย substring match
+    """
+    n = ngram_index['n']
+    grams = {token[j:j + n] for term in search_terms for token in WORD_PATTERN.findall(term) for j in range(len(token) - n + 1)}
+    if not grams:
+        return None
+
+    postings = []
+    for gram in grams:
+        chunk_id = ngram_index['gramToChunkMap'].get(gram)
+        chunk_data = get_ngram_chunk(chunk_id) if chunk_id is not None else None
+        if not chunk_data or gram not in chunk_data:
+            return []
+        postings.append(chunk_data[gram])
+    postings.sort(key=len)
+    shortest, others = postings[0], postings[1:]
+
+    def in_posting(posting, record_id):
+        pos = bisect_left(posting, record_id)
+        return pos < len(posting) and posting[pos] == record_id
+
+    return (ngram_index['records'][record_id] for record_id in shortest[:NGRAM_MAX_SCANNED]
+            if all(in_posting(posting, record_id) for posting in others))
+
 def get_chunk(chunk_id: int):
     if chunk_id in chunk_cache:
         return chunk_cache[chunk_id]
@@ -70,31 +175,21 @@ def calculate_score(preview, original_query, search_terms):
 
 
 
-@app.route('/search')
-def search():
+def search_records(query: str, max_results: int):
     """
-    Endpoint สำหรับค้นหาเพลง (ปรับปรุงใหม่)
-    - รับ 'q' สำหรับคำค้นหา
-    - รับ 'maxResults' (optional) สำหรับจำกัดจำนวนผลลัพธ์
+    ค้นหาเพลงจาก index แล้วคืนค่าเป็น list ของ record ที่เรียงตามคะแนนแล้ว
+    (query ต้องเป็นตัวพิมพ์เล็กและตัดช่องว่างหัวท้ายแล้ว)
     """
-    if not master_index:
-        return jsonify({"error": "Server is not ready. Master Index not loaded."}), 503
-
-    query = request.args.get('q', '').lower().strip()
-    
-    try:
-        max_results = int(request.args.get('maxResults', 50))
-    except ValueError:
-        max_results = 50
-        
-    if len(query) < 2:
-        return jsonify({"error": "Query must be at least 2 characters long."}), 400
-
-    
     search_terms = [word for word in query.split(' ') if word]
     prefix = search_terms[0]
 
-    matching_words = [word for word in master_index['words'] if word.startswith(prefix)]
+    # master_index['words'] ถูกเรียงไว้แล้ว จึงใช้ bisect หาช่วงของคำที่ขึ้นต้นด้วย prefix แทนการไล่ทุกคำ
+    words = master_index['words']
+    matching_words = []
+    for pos in range(bisect_left(words, prefix), len(words)):
+        if not words[pos].startswith(prefix):
+            break
+        matching_words.append(words[pos])
     
     required_chunks = {master_index['wordToChunkMap'].get(word) for word in matching_words}
     required_chunks.discard(None)
@@ -119,6 +214,22 @@ def search():
                         if original_index not in unique_scored_results or score < unique_scored_results[original_index]['score']:
                             unique_scored_results[original_index] = {'preview': preview, 'score': score}
 
+    # [+] ค้นหากลางคำ (infix) ผ่าน n-gram index แล้วตรวจสอบซ้ำด้วย substring match
+    # หยุดเมื่อได้ผลลัพธ์ครบ NGRAM_HITS_PER_RESULT เท่าของ max_results เพื่อจำกัดเวลาค้นหา
+    if ngram_index:
+        hits, max_hits = 0, max_results * NGRAM_HITS_PER_RESULT
+        for preview in get_ngram_candidates(search_terms) or []:
+            if hits >= max_hits:
+                break
+            original_index = preview['i']
+            if original_index in unique_scored_results:
+                hits += 1
+                continue
+            full_text_preview = f"{preview.get('t','')} {preview.get('a','')}".lower()
+            if all(term in full_text_preview for term in search_terms):
+                unique_scored_results[original_index] = {'preview': preview, 'score': calculate_score(preview, query, search_terms)}
+                hits += 1
+
     
     sorted_results = sorted(unique_scored_results.values(), key=lambda item: item['score'])
 
@@ -126,7 +237,7 @@ def search():
     limited_results = sorted_results[:max_results]
 
     
-    final_records = [
+    return [
         {
             "TITLE": item['preview']['t'],
             "ARTIST": item['preview']['a'],
@@ -137,46 +248,392 @@ def search():
         for item in limited_results
     ]
 
-    return jsonify(final_records)
+@app.route('/search')
+def search():
+    """
+    Endpoint สำหรับค้นหาเพลง (ปรับปรุงใหม่)
+    - รับ 'q' สำหรับคำค้นหา
+    - รับ 'maxResults' (optional) สำหรับจำกัดจำนวนผลลัพธ์
+    """
+    if not master_index:
+        return jsonify({"error": "Server is not ready. Master Index not loaded."}), 503
 
+    query = request.args.get('q', '').lower().strip()
+    
+    try:
+        max_results = int(request.args.get('maxResults', 50))
+    except ValueError:
+        max_results = 50
+        
+    if len(query) < 2:
+        return jsonify({"error": "Query must be at least 2 characters long."}), 400
+
+    return jsonify(search_records(query, max_results))
+
+@app.route('/search_batch', methods=['POST'])
+def search_batch():
+    """
+    ค้นหาหลายคำในครั้งเดียว
+    - body: {"queries": ["q1", "q2", ...], "maxResults": 50}
+      (แต่ละ query อาจเป็น {"q": "...", "maxResults": 10} ก็ได้)
+    - คืนค่า list ตามลำดับ query: {"q": ..., "results": [...]} หรือ {"q": ..., "error": ...}
+    """
+    if not master_index:
+        return jsonify({"error": "Server is not ready. Master Index not loaded."}), 503
+
+    body = request.get_json(silent=True) or {}
+    queries = body.get('queries') if isinstance(body, dict) else None
+    if not isinstance(queries, list) or not queries:
+        return jsonify({"error": "Body must be JSON with a non-empty 'queries' list."}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({"error": f"Too many queries (max {MAX_BATCH_QUERIES})."}), 400
+
+    try:
+        default_max_results = int(body.get('maxResults', 50))
+    except (TypeError, ValueError):
+        default_max_results = 50
+
+    batch_results = []
+    for item in queries:
+        raw_query, max_results = item, default_max_results
+        if isinstance(item, dict):
+            raw_query = item.get('q')
+            try:
+                max_results = int(item.get('maxResults', default_max_results))
+            except (TypeError, ValueError):
+                pass
+        if not isinstance(raw_query, str):
+            batch_results.append({"q": raw_query, "error": "Query must be a string or an object with a string 'q'."})
+            continue
+        query = raw_query.lower().strip()
+        if len(query) < 2:
+            batch_results.append({"q": raw_query, "error": "Query must be at least 2 characters long."})
+        else:
+            batch_results.append({"q": raw_query, "results": search_records(query, max_results)})
+
+    return jsonify(batch_results)
+
+
+
+def resolve_song_location(super_index: int, original_index: int):
+    """
+    คืนค่า (superIndex, member ใน super zip หรือ None) โดย resolve เพลงที่ถูก dedup ผ่าน song manifest
+    """
+    if original_index in song_aliases:
+        return song_aliases[original_index]
+    return super_index, None
+
+def find_song_member(names, original_index: int, alias_member=None):
+    """
+    หาไฟล์เพลงจากรายชื่อไฟล์ใน super zip คืนค่า (member, target_filename, mime_type) หรือ None ถ้าไม่พบ
+    """
+    filename_zip = f"{original_index}.zip"
+    filename_emk = f"{original_index}.emk"
+    if alias_member:
+        filename_zip, filename_emk = (alias_member, None) if alias_member.endswith('.zip') else (None, alias_member)
+
+    if filename_zip in names:
+        return filename_zip, f"song_{original_index}.zip", "application/zip"
+    if filename_emk in names:
+        return filename_emk, f"song_{original_index}.emk", "application/octet-stream"
+    return None
+
+def get_super_zip_members(super_zip_path: str):
+    """
+    อ่าน central directory ของ super zip (cache ไว้ตาม mtime/size) คืนค่า (dict ชื่อไฟล์ -> ZipInfo, mtime)
+    """
+    stat = os.stat(super_zip_path)
+    cached = super_zip_cache.get(super_zip_path)
+    if cached and cached[0] == (stat.st_mtime_ns, stat.st_size):
+        return cached[1], stat.st_mtime
+    with zipfile.ZipFile(super_zip_path, 'r') as zf:
+        members = {info.filename: info for info in zf.infolist()}
+    super_zip_cache[super_zip_path] = ((stat.st_mtime_ns, stat.st_size), members)
+    return members, stat.st_mtime
+
+def get_member_data_offset(f, info: zipfile.ZipInfo) -> int:
+    """
+    ตำแหน่งเริ่มต้นของข้อมูลไฟล์ใน zip (ต่อจาก local file header)
+    """
+    f.seek(info.header_offset)
+    local_header = f.read(30)
+    name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+    return info.header_offset + 30 + name_length + extra_length
 
+def stream_file_range(path: str, info: zipfile.ZipInfo, start: int, stop: int):
+    """
+    ส่งข้อมูลเพลงช่วง [start, stop) ถ้าเก็บแบบ ZIP_STORED จะอ่านจาก offset ในไฟล์ zip ตรงๆ
+    zip รุ่นเก่าที่บีบอัดแบบ deflate ไม่สามารถอ่านเฉพาะช่วงได้ ต้องแตกไฟล์ทั้งไฟล์ก่อนแล้วตัดช่วง
+    (เก็บผลไว้ใน legacy_member_cache เพื่อให้การดาวน์โหลดต่อครั้งถัดไปไม่ต้องแตกไฟล์ซ้ำ)
+    ถ้าอ่านได้ไม่ครบตาม Content-Length จะ raise เพื่อตัดการเชื่อมต่อแทนการส่งข้อมูลไม่ครบแบบเงียบๆ
+    """
+    if info.compress_type != zipfile.ZIP_STORED:
+        key = (path, info.filename, info.CRC)
+        with legacy_member_cache_lock:
+            data = legacy_member_cache.get(key)
+            if data is not None:
+                legacy_member_cache.move_to_end(key)
+        if data is None:
+            with zipfile.ZipFile(path, 'r') as zf:
+                data = zf.read(info.filename)
+            with legacy_member_cache_lock:
+                legacy_member_cache[key] = data
+                legacy_member_cache.move_to_end(key)
+                while len(legacy_member_cache) > LEGACY_MEMBER_CACHE_SIZE:
+                    legacy_member_cache.popitem(last=False)
+        yield data[start:stop]
+        return
+    with open(path, 'rb') as f:
+        f.seek(get_member_data_offset(f, info) + start)
+        remaining = stop - start
+        while remaining > 0:
+            block = f.read(min(remaining, 64 * 1024))
+            if not block:
+                raise IOError(f"Unexpected end of file reading {info.filename} from {path} ({remaining} bytes short).")
+            remaining -= len(block)
+            yield block
 
 @app.route('/get_song')
 def get_song():
+    """
+    Endpoint สำหรับดาวน์โหลดเพลง
+    - รองรับ conditional GET (ETag จาก build version + CRC ของไฟล์, Last-Modified จาก super zip) -> 304
+    - รองรับ Range แบบช่วงเดียว (If-Range) -> 206 สำหรับดาวน์โหลดต่อ
+    """
     try:
         super_index = int(request.args.get('superIndex'))
         original_index = int(request.args.get('originalIndex'))
     except (TypeError, ValueError):
         return jsonify({"error": "Invalid 'superIndex' or 'originalIndex'. They must be integers."}), 400
 
-    super_zip_path = os.path.join("/Users/digixtwo/Desktop/karaoke_API/karaoke.env/dbf-karaoke-last/processed_karaoke", f"{super_index}.zip")
+    super_index, alias_member = resolve_song_location(super_index, original_index)
+    super_zip_path = os.path.join(SUPER_ZIP_PATH, f"{super_index}.zip")
 
     if not os.path.exists(super_zip_path):
         return jsonify({"error": f"Super ZIP for index {super_index} not found."}), 404
 
     try:
-        with zipfile.ZipFile(super_zip_path, 'r') as zf:
-            filename_zip = f"{original_index}.zip"
-            filename_emk = f"{original_index}.emk"
-            song_data, target_filename, mime_type = None, "", ""
-
-            if filename_zip in zf.namelist():
-                song_data = zf.read(filename_zip)
-                target_filename = f"song_{original_index}.zip"
-                mime_type = "application/zip"
-            elif filename_emk in zf.namelist():
-                song_data = zf.read(filename_emk)
-                target_filename = f"song_{original_index}.emk"
-                mime_type = "application/octet-stream"
-            
-            if song_data:
-                return send_file(io.BytesIO(song_data), mimetype=mime_type, as_attachment=True, download_name=target_filename)
+        members, mtime = get_super_zip_members(super_zip_path)
+        found = find_song_member(members, original_index, alias_member)
+        if not found:
+            return jsonify({"error": f"Song with originalIndex {original_index} not found inside super zip {super_index}."}), 404
+        member, target_filename, mime_type = found
+        info = members[member]
+
+        build_version = master_index.get('lastBuilt', '') if master_index else str(int(mtime))
+        build_id = hashlib.blake2b(build_version.encode('utf-8'), digest_size=6).hexdigest()
+        etag = f"{build_id}-{super_index}-{info.CRC:08x}-{info.file_size}"
+        last_modified = datetime.datetime.fromtimestamp(int(mtime), tz=datetime.timezone.utc)
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains_weak(etag)
+        else:
+            not_modified = bool(request.if_modified_since and last_modified <= request.if_modified_since)
+
+        length = info.file_size
+        start, stop, status = 0, length, 200
+        byte_range = request.range if not not_modified else None
+        if_range_header = request.headers.get('If-Range', '').strip()
+        if byte_range and if_range_header:
+            # If-Range ต้องเทียบแบบ strong (RFC 7233 §3.2): ไม่รับ weak ETag และรับวันที่เฉพาะเมื่อ
+            # Last-Modified เป็น strong validator (ไฟล์ไม่ได้ถูกแก้ไขภายใน 1 วินาทีล่าสุด) กันการต่อไฟล์จากคนละ build
+            if_range = request.if_range
+            if if_range_header.startswith('W/'):
+                range_matches = False
+            elif if_range_header.startswith('"'):
+                range_matches = if_range.etag == etag
             else:
-                return jsonify({"error": f"Song with originalIndex {original_index} not found inside super zip {super_index}."}), 404
+                last_modified_is_strong = time.time() - mtime >= 1
+                range_matches = bool(last_modified_is_strong and if_range.date and if_range.date == last_modified)
+            if not range_matches:
+                byte_range = None
+        if byte_range and byte_range.units == 'bytes' and len(byte_range.ranges) == 1:
+            satisfiable = byte_range.range_for_length(length)
+            if satisfiable is None:
+                response = Response(status=416)
+                response.headers['Content-Range'] = f"bytes */{length}"
+                return response
+            (start, stop), status = satisfiable, 206
+
+        if not_modified:
+            response = Response(status=304)
+        else:
+            response = Response(stream_file_range(super_zip_path, info, start, stop), status=status, mimetype=mime_type)
+            response.headers['Content-Length'] = str(stop - start)
+            response.headers['Content-Disposition'] = f"attachment; filename={target_filename}"
+            if status == 206:
+                response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{length}"
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.headers['Accept-Ranges'] = 'bytes'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         print(f"Error processing /get_song: {e}")
         return jsonify({"error": "An internal error occurred while retrieving the file."}), 500
 
+class ZipStreamBuffer(io.RawIOBase):
+    """
+    Stream ที่เขียนได้อย่างเดียว (ไม่ seek) ให้ zipfile เขียนลงแล้วดึงข้อมูลออกไปส่งทีละส่วน
+    """
+    def __init__(self):
+        self.parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def pop(self) -> bytes:
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+def parse_song_pairs():
+    """
+    อ่านรายการ (superIndex, originalIndex) จาก JSON body {"songs": [...]} หรือ query ?songs=0:12,3:40
+    แต่ละรายการใน JSON เป็น [superIndex, originalIndex] หรือ {"superIndex": ..., "originalIndex": ...}
+    """
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        items = body.get('songs') if isinstance(body, dict) else body
+    else:
+        items = [pair.split(':') for pair in request.args.get('songs', '').split(',') if pair]
+    if not isinstance(items, list):
+        raise ValueError("'songs' must be a list.")
+    if len(items) > MAX_BUNDLE_SONGS:
+        raise ValueError(f"Too many songs (max {MAX_BUNDLE_SONGS}).")
+
+    pairs, seen = [], set()
+    for item in items:
+        if isinstance(item, dict):
+            item = (item.get('superIndex'), item.get('originalIndex'))
+        if not isinstance(item, (list, tuple)) or len(item) != 2:
+            raise ValueError("Each song must be a (superIndex, originalIndex) pair.")
+        pair = (int(item[0]), int(item[1]))
+        if pair not in seen:
+            seen.add(pair)
+            pairs.append(pair)
+    return pairs
+
+@app.route('/get_songs', methods=['GET', 'POST'])
+def get_songs():
+    """
+    ดาวน์โหลดหลายเพลงในไฟล์ ZIP เดียว
+    - จัดกลุ่มตาม super zip แล้วเปิดแต่ละไฟล์เพียงครั้งเดียว
+    - ส่งแบบ stream (ZIP_STORED เพราะไฟล์เพลงถูกบีบอัดอยู่แล้ว) พร้อม manifest.json ที่ท้ายไฟล์
+    """
+    try:
+        pairs = parse_song_pairs()
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid song list: {e}"}), 400
+    if not pairs:
+        return jsonify({"error": "No songs requested."}), 400
+
+    groups = {}
+    for super_index, original_index in pairs:
+        resolved_super_index, alias_member = resolve_song_location(super_index, original_index)
+        groups.setdefault(resolved_super_index, []).append((original_index, alias_member))
+
+    def generate():
+        buffer = ZipStreamBuffer()
+        found, missing = [], []
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED, allowZip64=True) as bundle:
+            for super_index, songs in groups.items():
+                super_zip_path = os.path.join(SUPER_ZIP_PATH, f"{super_index}.zip")
+                if not os.path.exists(super_zip_path):
+                    missing.extend(original_index for original_index, _ in songs)
+                    continue
+                try:
+                    zf = zipfile.ZipFile(super_zip_path, 'r')
+                except (OSError, zipfile.BadZipFile) as e:
+                    print(f"Error processing /get_songs for super zip {super_index}: {e}")
+                    missing.extend(original_index for original_index, _ in songs)
+                    continue
+                with zf:
+                    names = set(zf.namelist())
+                    for original_index, alias_member in songs:
+                        song = find_song_member(names, original_index, alias_member)
+                        if not song:
+                            missing.append(original_index)
+                            continue
+                        member, target_filename, _ = song
+                        try:
+                            song_data = zf.read(member)
+                        except Exception as e:
+                            print(f"Error processing /get_songs for {member} in super zip {super_index}: {e}")
+                            missing.append(original_index)
+                            continue
+                        bundle.writestr(target_filename, song_data)
+                        found.append({"_originalIndex": original_index, "_superIndex": super_index, "file": target_filename})
+                        yield buffer.pop()
+            bundle.writestr('manifest.json', json.dumps({"songs": found, "missing": missing}))
+        yield buffer.pop()
+
+    response = Response(generate(), mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename=songs.zip'
+    return response
+
+def get_file_etag(file_path: str) -> str:
+    """
+    Strong ETag จาก hash ของไฟล์ที่ส่งจริง (cache ไว้ตาม mtime/size)
+    """
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_mtime_ns, stat.st_size)
+    if key not in etag_cache:
+        h = hashlib.blake2b(digest_size=16)
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(block)
+        etag_cache[key] = h.hexdigest()
+    return etag_cache[key]
+
+def send_index_file(json_path: str, immutable: bool):
+    """
+    ส่งไฟล์ index จากดิสก์ตรงๆ โดยเลือกไฟล์ .br/.zst/.gz ตาม Accept-Encoding
+    """
+    encoding, file_path = None, json_path
+    candidates = [(request.accept_encodings.quality(enc), -order, enc, ext)
+                  for order, (enc, ext) in enumerate(PRECOMPRESSED_ENCODINGS)]
+    for quality, _, enc, ext in sorted(candidates, reverse=True):
+        if quality > 0 and os.path.exists(json_path + ext):
+            encoding, file_path = enc, json_path + ext
+            break
+
+    if not os.path.exists(file_path):
+        return jsonify({"error": "Index file not found."}), 404
+
+    etag = get_file_etag(file_path)
+    cache_control = "public, max-age=31536000, immutable" if immutable else "no-cache"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = send_file(file_path, mimetype='application/json', download_name=os.path.basename(json_path), etag=False, conditional=False)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@app.route('/index/master_index_v6.json')
+def get_master_index_file():
+    """
+    Master index สำหรับ client ที่ค้นหาเอง (ต้อง revalidate ด้วย ETag ทุกครั้ง)
+    """
+    return send_index_file(MASTER_INDEX_PATH, immutable=False)
+
+@app.route('/index/preview_chunk_v6/<int:chunk_id>.json')
+def get_chunk_file(chunk_id: int):
+    """
+    Preview chunk แบบ raw
+    - ถ้าส่ง 'v' ตรงกับ lastBuilt ของ master index จะ cache แบบ immutable ได้
+    """
+    build_version = request.args.get('v')
+    immutable = bool(master_index and build_version and build_version == master_index.get('lastBuilt'))
+    return send_index_file(os.path.join(CHUNK_PATH, f"{chunk_id}.json"), immutable)
+
 @app.route('/')
 def index():
     return """<h1>Karaoke API is Running</h1>..."""
@@ -186,4 +643,6 @@ def index():
 
 if __name__ == '__main__':
     load_master_index()
+    load_ngram_index()
+    load_song_manifest()
     app.run(host='0.0.0.0', port=5005, debug=True)
\ No newline at end of file
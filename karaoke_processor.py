@@ -1,21 +1,35 @@
 import sys
 import os
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLabel, QLineEdit, QPushButton, QSpinBox, QCheckBox, QTextEdit,
+    QLabel, QLineEdit, QPushButton, QSpinBox, QCheckBox, QPlainTextEdit,
     QFileDialog, QGroupBox, QProgressBar, QMessageBox,
     QGridLayout
 )
-from PyQt6.QtCore import QThread, pyqtSignal
+from PyQt6.QtCore import QThread, QTimer, pyqtSignal
 import concurrent.futures
+import threading
+from collections import deque
 import struct
 import zipfile
 import io
 import json
+import gzip
+import hashlib
 import datetime
 from dataclasses import dataclass, asdict
 
+# [+] ตัวบีบอัดเสริม (ถ้าไม่ได้ติดตั้งจะสร้างเฉพาะ .gz)
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 # ==============================================================================
 # Data Structures (ไม่เปลี่ยนแปลง)
 # ==============================================================================
@@ -60,6 +74,13 @@ class MasterIndex:
     buildTime: int
     lastBuilt: str
 
+@dataclass
+class NgramMasterIndex:
+    n: int
+    totalRecords: int
+    gramToChunkMap: Dict[str, int]
+    lastBuilt: str
+
 # ==============================================================================
 # Backend Logic (ไม่เปลี่ยนแปลง)
 # ==============================================================================
@@ -133,16 +154,30 @@ class DBFParser:
             return {"midi": midi, "lyr": lyr, "cur": cur} if all([midi, lyr, cur]) else None
         return None
 
+    # [+] อ่านไฟล์เพลงพร้อมคำนวณ hash ของ payload (ทำใน worker thread) เฉพาะเมื่อเปิด dedup
+    def get_song_files_with_digest(self, track: ITrackData, base_dir: str, compute_digest: bool = True) -> Tuple[Optional[Dict[str, bytes]], Optional[str]]:
+        files = self.get_song_files_raw(track, base_dir)
+        if not files: return None, None
+        if not compute_digest: return files, None
+        h = hashlib.blake2b(digest_size=16)
+        for key in sorted(files):
+            h.update(f"{key}:{len(files[key])}:".encode('ascii'))
+            h.update(files[key])
+        return files, h.hexdigest()
+
 class SongProcessor:
-    def __init__(self, batch_size: int, large_zip_size_limit_mb: int, output_dir: str, create_zips: bool, status_callback: Optional[callable]):
+    def __init__(self, batch_size: int, large_zip_size_limit_mb: int, output_dir: str, create_zips: bool, status_callback: Optional[callable], dedup_songs: bool = False):
         self.batch_size = batch_size
         self.limit_bytes = large_zip_size_limit_mb * 1024 * 1024
         self.output_dir = output_dir
         self.create_zips = create_zips
+        self.dedup_songs = dedup_songs
         self.log = status_callback or (lambda msg: None)
         if self.create_zips: os.makedirs(self.output_dir, exist_ok=True)
         self.current_original_index = 0
         self.current_super_index = 0
+        self.blob_locations: Dict[str, Tuple[ITrackData, str]] = {} # digest -> (track ตัวแรก, ชื่อไฟล์ใน batch)
+        self.duplicate_songs: List[Tuple[ITrackData, ITrackData, str]] = []
         self._reset_batch()
         self.log(f"Processor init: Batch {self.batch_size}, Limit {large_zip_size_limit_mb}MB")
 
@@ -154,22 +189,34 @@ class SongProcessor:
             zf.writestr('song.cur', cur)
         return buf.getvalue()
 
-    def process_song(self, track: ITrackData, files: Optional[Dict[str, bytes]]) -> bool:
+    def process_song(self, track: ITrackData, files: Optional[Dict[str, bytes]], digest: Optional[str] = None) -> bool:
         if not files: return False
-        content, filename_in_batch = None, ""
-        if track.SUB_TYPE == "NCN" and all(k in files for k in ['midi', 'lyr', 'cur']):
+        is_ncn = track.SUB_TYPE == "NCN" and all(k in files for k in ['midi', 'lyr', 'cur'])
+        is_emk = track.SUB_TYPE == "EMK" and 'emk' in files
+        if not (is_ncn or is_emk): return False
+
+        # [+] เพลงที่ payload ซ้ำกับเพลงก่อนหน้า: ไม่บีบอัด/เก็บซ้ำ แค่ชี้ไปยังไฟล์เดิมผ่าน song manifest
+        if self.dedup_songs and digest and digest in self.blob_locations:
+            canonical_track, member = self.blob_locations[digest]
+            track._originalIndex = self.current_original_index
+            self.duplicate_songs.append((track, canonical_track, member))
+            self.current_original_index += 1
+            return True
+
+        if is_ncn:
             content = self._compress_midi_files(files['midi'], files['lyr'], files['cur'])
             filename_in_batch = f"{self.current_original_index}.zip"
-        elif track.SUB_TYPE == "EMK" and 'emk' in files:
+        else:
             content = files['emk']
             filename_in_batch = f"{self.current_original_index}.emk"
-        else: return False
-        
+
         if content is None: return False
         track._originalIndex = self.current_original_index
+        if self.dedup_songs and digest: self.blob_locations[digest] = (track, filename_in_batch)
         self.current_batch_songs.append((track, content))
         if self.create_zips and self.zip_writer:
-            self.zip_writer.writestr(filename_in_batch, content)
+            # เก็บแบบ ZIP_STORED เพราะไฟล์เพลงถูกบีบอัดอยู่แล้ว และให้ API ส่งแบบ Range จาก offset ใน zip ได้ตรงๆ
+            self.zip_writer.writestr(filename_in_batch, content, compress_type=zipfile.ZIP_STORED)
             self.current_zip_size += len(content)
         self.current_original_index += 1
         if len(self.current_batch_songs) >= self.batch_size or (self.create_zips and self.current_zip_size >= self.limit_bytes):
@@ -201,6 +248,20 @@ class SongProcessor:
             self.log("Finalizing remaining songs...")
             self._finalize_batch()
 
+    # [+] เขียน Data/song_manifest_v6.json ให้ API resolve เพลงซ้ำไปยัง (_superIndex, member) ของเพลงต้นฉบับ
+    def write_song_manifest(self):
+        aliases = {}
+        for track, canonical_track, member in self.duplicate_songs:
+            track._superIndex = canonical_track._superIndex
+            aliases[str(track._originalIndex)] = {"s": canonical_track._superIndex, "m": member}
+        data_dir = os.path.join(self.output_dir, "Data")
+        os.makedirs(data_dir, exist_ok=True)
+        manifest = {"aliases": aliases, "uniqueSongs": self.current_original_index - len(aliases), "duplicateSongs": len(aliases)}
+        with open(os.path.join(data_dir, "song_manifest_v6.json"), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, separators=(',', ':'))
+        if aliases:
+            self.log(f"Deduplicated {len(aliases)} songs (stored {manifest['uniqueSongs']} unique payloads).")
+
     def create_karaoke_archives(self):
         if not self.create_zips: return
         self.log("Creating karaoke archives...")
@@ -230,20 +291,31 @@ class SongProcessor:
 
 
 class IndexBuilder:
-    def __init__(self, output_dir: str, status_callback: Optional[callable]):
+    NGRAM_SIZE = 3
+
+    def __init__(self, output_dir: str, status_callback: Optional[callable], precompress: bool = True, build_ngrams: bool = False):
         self.output_dir = output_dir
         self.log = status_callback or (lambda msg: None)
+        self.precompress = precompress
+        self.build_ngrams = build_ngrams
         os.makedirs(os.path.join(self.output_dir, "Data", "preview_chunk_v6"), exist_ok=True)
+        if self.build_ngrams: os.makedirs(os.path.join(self.output_dir, "Data", "ngram_chunk_v6"), exist_ok=True)
 
     def _extract_words(self, text: str) -> List[str]:
         import re
         return [w for w in re.findall(r'[a-zA-Z\d\u0e00-\u0e7f]+', text.lower()) if len(w) > 1]
 
+    # [+] n-gram ของตัวอักษรภายในแต่ละคำ (ชื่อเพลงภาษาไทยไม่มีเว้นวรรค จึงค้นกลางคำได้)
+    def _extract_ngrams(self, text: str) -> set:
+        n = self.NGRAM_SIZE
+        return {word[j:j + n] for word in self._extract_words(text) for j in range(len(word) - n + 1)}
+
     def build_index(self, all_records: List[ITrackData], progress_callback: Optional[callable]):
         self.log("Building search index...")
         start_time = datetime.datetime.now()
         total_records = len(all_records)
         word_map = {}
+        ngram_records, gram_postings = [], {}
         for i, record in enumerate(all_records):
             if progress_callback and (i % 500 == 0 or i == total_records - 1):
                 progress_callback(int((i / total_records) * 50)) # 0-50%
@@ -255,6 +327,12 @@ class IndexBuilder:
                 for word in self._extract_words(text):
                     if word not in word_map: word_map[word] = []
                     word_map[word].append(preview)
+                if self.build_ngrams:
+                    record_id = len(ngram_records)
+                    ngram_records.append(preview)
+                    for gram in self._extract_ngrams(text):
+                        if gram not in gram_postings: gram_postings[gram] = []
+                        gram_postings[gram].append(record_id)
 
         self.log("Sorting words and creating chunks...")
         sorted_words = sorted(word_map.keys())
@@ -275,39 +353,137 @@ class IndexBuilder:
             chunk_size += entry_size
         if chunk: self._save_chunk(chunk_id, chunk)
 
+        last_built = datetime.datetime.now().isoformat()
+        if self.build_ngrams:
+            self._build_ngram_index(ngram_records, gram_postings, last_built)
+
         self.log("Saving master index...")
         master_index = MasterIndex(totalRecords=total_records, words=sorted_words, wordToChunkMap=word_to_chunk,
                                    buildTime=int((datetime.datetime.now() - start_time).total_seconds() * 1000),
-                                   lastBuilt=datetime.datetime.now().isoformat())
-        with open(os.path.join(self.output_dir, "Data", "master_index_v6.json"), 'w', encoding='utf-8') as f:
-            json.dump(asdict(master_index), f, separators=(',', ':'))
+                                   lastBuilt=last_built)
+        self._write_json(os.path.join(self.output_dir, "Data", "master_index_v6.json"), asdict(master_index))
         self.log(f"Index built: {len(sorted_words)} words, {chunk_id+1} chunks.")
 
+    def _build_ngram_index(self, records: List[dict], gram_postings: Dict[str, List[int]], last_built: str):
+        """
+        สร้าง posting list: gram -> record id (เรียงจากน้อยไปมาก) แบ่งเป็น chunk เหมือน preview chunk
+        record id อ้างอิงลำดับใน ngram_records_v6.json
+        """
+        self.log(f"Building {self.NGRAM_SIZE}-gram index: {len(gram_postings)} grams...")
+        data_dir = os.path.join(self.output_dir, "Data")
+        gram_to_chunk, chunk, chunk_size, chunk_id = {}, {}, 0, 0
+        for gram in sorted(gram_postings):
+            entry_size = len(json.dumps(gram_postings[gram]).encode('utf-8'))
+            if chunk_size + entry_size > 5 * 1024 * 1024 and chunk:
+                self._write_json(os.path.join(data_dir, "ngram_chunk_v6", f"{chunk_id}.json"), chunk)
+                chunk_id += 1
+                chunk, chunk_size = {}, 0
+            chunk[gram] = gram_postings[gram]
+            gram_to_chunk[gram] = chunk_id
+            chunk_size += entry_size
+        if chunk: self._write_json(os.path.join(data_dir, "ngram_chunk_v6", f"{chunk_id}.json"), chunk)
+
+        self._write_json(os.path.join(data_dir, "ngram_records_v6.json"), records)
+        ngram_master = NgramMasterIndex(n=self.NGRAM_SIZE, totalRecords=len(records), gramToChunkMap=gram_to_chunk, lastBuilt=last_built)
+        self._write_json(os.path.join(data_dir, "ngram_master_v6.json"), asdict(ngram_master))
+        self.log(f"N-gram index built: {len(gram_postings)} grams, {chunk_id+1} chunks.")
+
     def _save_chunk(self, id: int, data: dict):
         path = os.path.join(self.output_dir, "Data", "preview_chunk_v6", f"{id}.json")
-        with open(path, 'w', encoding='utf-8') as f: json.dump(data, f, separators=(',',':'))
+        self._write_json(path, data)
+
+    # [+] เขียน JSON พร้อมไฟล์บีบอัดล่วงหน้า (.gz/.br/.zst) ให้ API ส่งได้ทันทีโดยไม่ต้องบีบอัดซ้ำ
+    def _write_json(self, path: str, data):
+        raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        with open(path, 'wb') as f: f.write(raw)
+        variants = {
+            '.gz': (lambda b: gzip.compress(b, compresslevel=9, mtime=0)) if self.precompress else None,
+            '.br': (lambda b: brotli.compress(b, quality=11)) if self.precompress and brotli else None,
+            '.zst': (lambda b: zstandard.ZstdCompressor(level=19).compress(b)) if self.precompress and zstandard else None,
+        }
+        for ext, compress in variants.items():
+            if compress:
+                with open(path + ext, 'wb') as f: f.write(compress(raw))
+            elif os.path.exists(path + ext):
+                os.remove(path + ext) # ลบไฟล์เก่าที่ไม่ตรงกับ JSON ชุดใหม่
 
 # ==============================================================================
 # GUI Application
 # ==============================================================================
 
+UI_REFRESH_INTERVAL_MS = 100
+LOG_VIEW_MAX_LINES = 2000
+LOG_FILE_NAME = "processing_log.txt"
+
+class UIEventCoalescer:
+    """
+    รวม status/progress จาก worker thread แล้วให้ GUI ดึงไปแสดงตามรอบ timer
+    แทนการ emit signal ทุกข้อความ (log เต็มถูกเขียนลงไฟล์)
+    """
+    def __init__(self, max_lines: int = LOG_VIEW_MAX_LINES, log_file_path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._lines = deque(maxlen=max_lines)
+        self._dropped = 0
+        self._progress = None
+        self._last_status = None
+        self._log_file = None
+        if log_file_path:
+            try:
+                os.makedirs(os.path.dirname(log_file_path) or ".", exist_ok=True)
+                self._log_file = open(log_file_path, 'a', encoding='utf-8')
+                # เขียนตัวคั่นแต่ละรอบการทำงาน เพราะ log ของทุกรอบต่อท้ายในไฟล์เดียวกัน
+                self._log_file.write(f"\n===== Run started {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} =====\n")
+            except OSError:
+                self._log_file = None
+
+    def status(self, message: str):
+        line = f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {message}"
+        with self._lock:
+            if len(self._lines) == self._lines.maxlen: self._dropped += 1
+            self._lines.append(line)
+            self._last_status = message
+            if self._log_file: self._log_file.write(line + "\n")
+
+    def progress(self, value: int):
+        with self._lock:
+            self._progress = value
+
+    def drain(self):
+        """คืนค่า (progress, last_status, lines, dropped) ที่สะสมไว้ตั้งแต่รอบก่อน"""
+        with self._lock:
+            result = (self._progress, self._last_status, list(self._lines), self._dropped)
+            self._lines.clear()
+            self._progress, self._last_status, self._dropped = None, None, 0
+            if self._log_file: self._log_file.flush() # เขียน log ลงไฟล์ทุกรอบ timer
+        return result
+
+    def close(self):
+        with self._lock:
+            if self._log_file:
+                self._log_file.close()
+                self._log_file = None
+
 class ProcessingThread(QThread):
-    progress_update = pyqtSignal(int)
-    status_update = pyqtSignal(str)
     finished = pyqtSignal(bool, str)
 
     def __init__(self, config):
         super().__init__()
         self.config = config
         self.should_stop = False
+        self.events = UIEventCoalescer(log_file_path=config.get('log_file_path'))
 
     def stop(self):
-        self.status_update.emit("Stopping...")
+        self.events.status("Stopping...")
         self.should_stop = True
 
+    def _finish(self, success: bool, message: str):
+        # ส่งข้อความสรุปผลผ่าน events ด้วย เพื่อให้ถูกบันทึกลงไฟล์ log ก่อนปิดไฟล์
+        self.events.status(f"Finished: {message}")
+        self.finished.emit(success, message)
+
     # [+] เพิ่มเมธอดสำหรับสร้าง index.zip
     def _create_index_archive(self, output_dir: str):
-        self.status_update.emit("--- Creating final index archive (index.zip) ---")
+        self.events.status("--- Creating final index archive (index.zip) ---")
         zip_output_path = os.path.join(output_dir, 'index.zip')
         master_index_path = os.path.join(output_dir, 'Data', 'master_index_v6.json')
         chunks_dir_path = os.path.join(output_dir, 'Data', 'preview_chunk_v6')
@@ -318,42 +494,55 @@ class ProcessingThread(QThread):
         with zipfile.ZipFile(zip_output_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
             # ใช้ os.path.relpath เพื่อให้ได้ path ภายใน zip ที่ถูกต้อง (เช่น Data/master_index_v6.json)
             arcname_master = os.path.relpath(master_index_path, output_dir)
-            self.status_update.emit(f"Adding: {arcname_master}")
+            self.events.status(f"Adding: {arcname_master}")
             zf.write(master_index_path, arcname=arcname_master)
 
-            self.status_update.emit(f"Adding files from: {os.path.relpath(chunks_dir_path, output_dir)}")
+            # [+] song manifest จำเป็นสำหรับ resolve เพลงที่ถูก dedup เมื่อใช้ index.zip โดยไม่ผ่าน API
+            song_manifest_path = os.path.join(output_dir, 'Data', 'song_manifest_v6.json')
+            if os.path.exists(song_manifest_path):
+                arcname_manifest = os.path.relpath(song_manifest_path, output_dir)
+                self.events.status(f"Adding: {arcname_manifest}")
+                zf.write(song_manifest_path, arcname=arcname_manifest)
+
+            self.events.status(f"Adding files from: {os.path.relpath(chunks_dir_path, output_dir)}")
             for filename in os.listdir(chunks_dir_path):
+                if not filename.endswith('.json'): continue # ข้ามไฟล์ .gz/.br/.zst
                 file_on_disk = os.path.join(chunks_dir_path, filename)
                 if os.path.isfile(file_on_disk):
                     arcname_chunk = os.path.relpath(file_on_disk, output_dir)
                     zf.write(file_on_disk, arcname=arcname_chunk)
         
-        self.status_update.emit(f"Successfully created '{zip_output_path}'")
+        self.events.status(f"Successfully created '{zip_output_path}'")
 
 
     def run(self):
         try:
+            self.events.status("Processing started...")
             def scaled_updater(start, end):
-                return lambda p: self.progress_update.emit(start + int((p / 100) * (end - start))) if not self.should_stop else None
+                return lambda p: self.events.progress(start + int((p / 100) * (end - start))) if not self.should_stop else None
 
             # 1. DBF Read (0-5%)
-            self.status_update.emit("Reading DBF file...")
-            self.progress_update.emit(2)
+            self.events.status("Reading DBF file...")
+            self.events.progress(2)
             dbf_path = os.path.join(self.config['main_folder_path'], "Data", "SONG.DBF")
             if not os.path.exists(dbf_path):
-                self.finished.emit(False, f"DBF file not found at: {dbf_path}")
+                self._finish(False, f"DBF file not found at: {dbf_path}")
                 return
             with open(dbf_path, 'rb') as f: file_buffer = f.read()
-            if self.should_stop: return
+            if self.should_stop:
+                self._finish(False, "Processing stopped by user.")
+                return
 
             # 2. DBF Parse (5-15%)
-            self.progress_update.emit(5)
+            self.events.progress(5)
             parser = DBFParser()
             header = parser.parse_header(file_buffer)
-            self.status_update.emit(f"Parsing {header.record_count} records from DBF...")
-            all_records = parser.parse_records(file_buffer, header, self.status_update.emit)
-            self.progress_update.emit(15)
-            if self.should_stop: return
+            self.events.status(f"Parsing {header.record_count} records from DBF...")
+            all_records = parser.parse_records(file_buffer, header, self.events.status)
+            self.events.progress(15)
+            if self.should_stop:
+                self._finish(False, "Processing stopped by user.")
+                return
 
             # 3. Song Processing (15-80%)
             processor_config = {
@@ -361,7 +550,8 @@ class ProcessingThread(QThread):
                 'large_zip_size_limit_mb': self.config['large_zip_size_limit_mb'],
                 'output_dir': self.config['output_folder_path'],
                 'create_zips': self.config['create_zips'],
-                'status_callback': self.status_update.emit
+                'status_callback': self.events.status,
+                'dedup_songs': self.config['dedup_songs']
             }
             processor = SongProcessor(**processor_config)
             
@@ -369,51 +559,57 @@ class ProcessingThread(QThread):
             processed_count, total_songs = 0, len(all_records)
             
             with concurrent.futures.ThreadPoolExecutor(max_workers=self.config['max_workers']) as executor:
-                futures = {executor.submit(parser.get_song_files_raw, r, self.config['main_folder_path']): r for r in all_records}
+                futures = {executor.submit(parser.get_song_files_with_digest, r, self.config['main_folder_path'], self.config['dedup_songs']): r for r in all_records}
                 for future in concurrent.futures.as_completed(futures):
                     if self.should_stop: break
                     track_data = futures[future]
                     try:
-                        files = future.result()
-                        if processor.process_song(track_data, files):
+                        files, digest = future.result()
+                        if processor.process_song(track_data, files, digest):
                             processed_count += 1
                         if processed_count % 100 == 0 or processed_count == total_songs:
-                            self.status_update.emit(f"Processing songs: {processed_count}/{total_songs}")
+                            self.events.status(f"Processing songs: {processed_count}/{total_songs}")
                         song_updater(int((processed_count / total_songs) * 100))
                     except Exception as e:
-                        self.status_update.emit(f"Error processing {track_data.TITLE}: {e}")
+                        self.events.status(f"Error processing {track_data.TITLE}: {e}")
             
             if self.should_stop:
-                self.finished.emit(False, "Processing stopped by user.")
+                self._finish(False, "Processing stopped by user.")
                 return
 
             processor.finalize_remaining_batch()
+            processor.write_song_manifest()
             
             # 4. Archiving (80-90%)
             if self.config['create_zips']:
-                self.progress_update.emit(85)
+                self.events.progress(85)
                 processor.create_karaoke_archives()
             
             # [*] 5. Indexing (90-98%) - ปรับ Progress bar
-            self.progress_update.emit(90)
-            builder = IndexBuilder(self.config['output_folder_path'], self.status_update.emit)
+            self.events.progress(90)
+            builder = IndexBuilder(self.config['output_folder_path'], self.events.status, self.config['precompress_index'], self.config['build_ngram_index'])
             builder.build_index(all_records, scaled_updater(90, 98))
             
             # [+] 6. Final Index Zipping (98-100%) - ขั้นตอนใหม่
             if self.config['create_index_zip']:
-                self.progress_update.emit(98)
+                self.events.progress(98)
                 self._create_index_archive(self.config['output_folder_path'])
             
-            self.progress_update.emit(100)
-            self.finished.emit(True, f"Successfully processed {processed_count} songs.")
+            self.events.progress(100)
+            self._finish(True, f"Successfully processed {processed_count} songs.")
         except Exception as e:
             import traceback
-            self.finished.emit(False, f"A critical error occurred: {e}\n{traceback.format_exc()}")
+            self._finish(False, f"A critical error occurred: {e}\n{traceback.format_exc()}")
+        finally:
+            self.events.close() # ปิดไฟล์ log ทุกกรณีที่ thread จบการทำงาน
 
 class KaraokeGUI(QMainWindow):
     def __init__(self):
         super().__init__()
         self.processing_thread = None
+        self.ui_refresh_timer = QTimer(self)
+        self.ui_refresh_timer.setInterval(UI_REFRESH_INTERVAL_MS)
+        self.ui_refresh_timer.timeout.connect(self.flush_processing_events)
         self.init_ui()
         self.load_defaults_to_ui()
 
@@ -464,6 +660,18 @@ class KaraokeGUI(QMainWindow):
         self.create_index_zip_checkbox = QCheckBox("Create final index archive (index.zip)")
         settings_layout.addWidget(self.create_index_zip_checkbox, 6, 0, 1, 3)
 
+        # [+] Checkbox สำหรับรวมเพลงที่ไฟล์เหมือนกันให้เก็บเพียงชุดเดียว
+        self.dedup_songs_checkbox = QCheckBox("Deduplicate identical song files")
+        settings_layout.addWidget(self.dedup_songs_checkbox, 7, 0, 1, 3)
+
+        # [+] Checkbox สำหรับสร้างไฟล์ index ที่บีบอัดล่วงหน้า
+        self.precompress_index_checkbox = QCheckBox("Precompress index files (.gz, .br, .zst)")
+        settings_layout.addWidget(self.precompress_index_checkbox, 8, 0, 1, 3)
+
+        # [+] Checkbox สำหรับสร้าง n-gram index (ค้นหาคำกลางชื่อเพลง)
+        self.build_ngram_index_checkbox = QCheckBox("Build infix search index (n-gram)")
+        settings_layout.addWidget(self.build_ngram_index_checkbox, 9, 0, 1, 3)
+
         settings_group.setLayout(settings_layout)
         main_layout.addWidget(settings_group)
 
@@ -475,8 +683,9 @@ class KaraokeGUI(QMainWindow):
         log_layout.addWidget(self.progress_bar)
         self.status_label = QLabel("Ready.")
         log_layout.addWidget(self.status_label)
-        self.log_text = QTextEdit()
+        self.log_text = QPlainTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(LOG_VIEW_MAX_LINES) # [+] จำกัดจำนวนบรรทัดแบบ ring buffer
         log_layout.addWidget(self.log_text)
         log_group.setLayout(log_layout)
         main_layout.addWidget(log_group)
@@ -516,7 +725,11 @@ class KaraokeGUI(QMainWindow):
             'batch_size': self.batch_size_spin.value(),
             'large_zip_size_limit_mb': self.zip_size_spin.value(),
             'max_workers': self.max_workers_spin.value(),
-            'create_index_zip': self.create_index_zip_checkbox.isChecked() # [+] เพิ่ม config
+            'create_index_zip': self.create_index_zip_checkbox.isChecked(), # [+] เพิ่ม config
+            'dedup_songs': self.dedup_songs_checkbox.isChecked(),
+            'precompress_index': self.precompress_index_checkbox.isChecked(),
+            'build_ngram_index': self.build_ngram_index_checkbox.isChecked(),
+            'log_file_path': os.path.join(self.output_folder_edit.text(), LOG_FILE_NAME)
         }
         
     def load_defaults_to_ui(self):
@@ -538,6 +751,9 @@ class KaraokeGUI(QMainWindow):
         self.zip_size_spin.setValue(500)
         self.max_workers_spin.setValue(os.cpu_count() * 2 if os.cpu_count() else 8)
         self.create_index_zip_checkbox.setChecked(True) # [+] ตั้งค่าเริ่มต้น
+        self.dedup_songs_checkbox.setChecked(False)
+        self.precompress_index_checkbox.setChecked(True)
+        self.build_ngram_index_checkbox.setChecked(True)
         
     def validate_config(self) -> bool:
         if not os.path.isdir(self.main_folder_edit.text()):
@@ -552,26 +768,33 @@ class KaraokeGUI(QMainWindow):
         if not self.validate_config(): return
         self.start_btn.setEnabled(False)
         self.stop_btn.setEnabled(True)
-        self.log_message("Processing started...")
         self.processing_thread = ProcessingThread(self.get_config_from_ui())
-        self.processing_thread.progress_update.connect(self.progress_bar.setValue)
-        self.processing_thread.status_update.connect(self.update_status)
         self.processing_thread.finished.connect(self.processing_finished)
         self.processing_thread.start()
+        self.ui_refresh_timer.start()
 
     def stop_processing(self):
         if self.processing_thread and self.processing_thread.isRunning():
             self.processing_thread.stop()
             self.stop_btn.setEnabled(False)
 
-    def update_status(self, message):
-        self.status_label.setText(message)
-        self.log_message(message)
+    def flush_processing_events(self):
+        if not self.processing_thread: return
+        progress, last_status, lines, dropped = self.processing_thread.events.drain()
+        if progress is not None: self.progress_bar.setValue(progress)
+        if last_status is not None: self.status_label.setText(last_status)
+        if dropped:
+            self.log_message(f"... {dropped} log lines skipped (see {LOG_FILE_NAME})")
+        if lines:
+            self.log_text.appendPlainText("\n".join(lines))
+            self.log_text.verticalScrollBar().setValue(self.log_text.verticalScrollBar().maximum())
 
     def processing_finished(self, success, message):
+        self.ui_refresh_timer.stop()
+        self.flush_processing_events()
+        if self.processing_thread: self.processing_thread.events.close()
         self.start_btn.setEnabled(True)
         self.stop_btn.setEnabled(False)
-        self.log_message(f"Finished: {message}")
         if success:
             self.status_label.setText("Completed!")
             QMessageBox.information(self, "Success", message)
@@ -581,7 +804,7 @@ class KaraokeGUI(QMainWindow):
 
     def log_message(self, message):
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-        self.log_text.append(f"[{timestamp}] {message}")
+        self.log_text.appendPlainText(f"[{timestamp}] {message}")
         self.log_text.verticalScrollBar().setValue(self.log_text.verticalScrollBar().maximum())
 
     def closeEvent(self, event):
@@ -592,6 +815,8 @@ class KaraokeGUI(QMainWindow):
             if reply == QMessageBox.StandardButton.Yes:
                 self.stop_processing()
                 if self.processing_thread: self.processing_thread.wait(3000)
+                self.ui_refresh_timer.stop()
+                if self.processing_thread: self.processing_thread.events.close()
                 event.accept()
             else:
                 event.ignore()